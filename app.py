@@ -3,13 +3,60 @@ PE Findings Analyzer — Streamlit App
 Chat with your production efficiency findings/annotations database.
 """
 
+import hashlib
+import io
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 import pandas as pd
 
 from src.config import load_config_from_env, config_from_ui
-from src.data_loader import load_csv, detect_columns, get_dataset_summary, dataframe_to_text
+from src.data_loader import load_csv, detect_columns, get_dataset_summary, dataframe_to_text, parse_dates
 from src.llm_client import chat, check_connection
-from src.retriever import retrieve
+from src.retriever import build_prompt_context, lowercase_text_columns, retrieve
+from src import semantic_index
+
+HISTORY_WINDOW = 6  # Past messages sent to the LLM (last 3 exchanges)
+
+# ─── Cached helpers ──────────────────────────────────────────────────────────
+# Streamlit reruns the whole script on every widget interaction, so anything
+# derived from the uploaded file is memoised on the file's content hash.
+
+
+@st.cache_resource
+def parse_executor() -> ThreadPoolExecutor:
+    # One pool per process — module-level state would be recreated on every rerun
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="csv-parse")
+
+
+@st.cache_data(show_spinner=False, max_entries=2)  # Only re-uploads of the same bytes benefit
+def cached_load_csv(content: bytes) -> pd.DataFrame:
+    return load_csv(io.BytesIO(content))
+
+
+@st.cache_data(show_spinner=False)
+def cached_detect_columns(file_key: str, _df: pd.DataFrame) -> dict:
+    return detect_columns(_df)
+
+
+@st.cache_data(show_spinner=False)
+def cached_dataset_summary(file_key: str, _df: pd.DataFrame, col_map: dict) -> str:
+    return get_dataset_summary(_df, col_map)
+
+
+@st.cache_data(show_spinner=False)
+def cached_prompt_context(file_key: str, _df: pd.DataFrame, col_map: dict) -> tuple[str, str]:
+    return build_prompt_context(_df, col_map)
+
+
+# One index at a time: each is ~1 GB at 1M rows, and remapping the finding column builds a new one
+@st.cache_resource(show_spinner="Building semantic index...", max_entries=1)
+def cached_semantic_index(file_key: str, text_col: str, _df: pd.DataFrame):
+    index, _ = semantic_index.build_index(_df, text_col)
+    return index
+
 
 # ─── Page config ─────────────────────────────────────────────────────────────
 
@@ -51,6 +98,13 @@ with st.sidebar:
 
     st.subheader("Dataset")
     uploaded_file = st.file_uploader("Upload findings CSV", type=["csv"])
+    use_semantic = st.toggle(
+        "Semantic search",
+        value=semantic_index.is_available(),
+        disabled=not semantic_index.is_available(),
+        help="Embed findings locally and match by meaning, not just keywords. "
+             "Requires sentence-transformers and faiss-cpu.",
+    )
 
     if "df" in st.session_state:
         df = st.session_state["df"]
@@ -67,16 +121,31 @@ st.caption("Chat with your production efficiency findings database")
 
 if uploaded_file is not None:
     if "df" not in st.session_state or st.session_state.get("last_file") != uploaded_file.name:
-        with st.spinner("Loading data..."):
-            df = load_csv(uploaded_file)
-            col_map = detect_columns(df)
-            summary = get_dataset_summary(df, col_map)
+        with st.status("Parsing CSV...") as status:
+            content = uploaded_file.getvalue()
+            file_key = hashlib.md5(content).hexdigest()
+
+            # Parse off the script thread so progress keeps rendering on large files
+            t0 = time.monotonic()
+            future = parse_executor().submit(cached_load_csv, content)
+            while not future.done():
+                status.update(label=f"Parsing CSV... ({time.monotonic() - t0:.1f}s)")
+                time.sleep(0.2)
+            df = future.result()
+
+            status.update(label="Detecting columns...")
+            col_map = cached_detect_columns(file_key, df)
+            summary = cached_dataset_summary(file_key, df, col_map)
             st.session_state["df"] = df
+            st.session_state["file_key"] = file_key
             st.session_state["col_map"] = col_map
             st.session_state["summary"] = summary
+            st.session_state.pop("text_cols_lower", None)
+            st.session_state.pop("parsed_dates", None)
             st.session_state["last_file"] = uploaded_file.name
             st.session_state["messages"] = []
-        st.success(f"Loaded {len(df):,} rows")
+            st.session_state["history_window"] = deque(maxlen=HISTORY_WINDOW)
+            status.update(label=f"Loaded {len(df):,} rows", state="complete")
 
 # ─── Column mapping (if data loaded) ─────────────────────────────────────────
 
@@ -126,7 +195,28 @@ if "df" in st.session_state:
             "location_col": location_col if location_col != "(none)" else None,
         }
         st.session_state["col_map"] = col_map
-        st.session_state["summary"] = get_dataset_summary(df, col_map)
+        st.session_state["summary"] = cached_dataset_summary(
+            st.session_state["file_key"], df, col_map
+        )
+        st.session_state["prompt_context"] = cached_prompt_context(
+            st.session_state["file_key"], df, col_map
+        )
+
+        # Lowercased keyword-search columns, rebuilt only when the mapping changes
+        text_cols = [c for c in (col_map["finding_col"], col_map["asset_col"]) if c]
+        if st.session_state.get("text_cols_lower", {}).keys() != set(text_cols):
+            st.session_state["text_cols_lower"] = lowercase_text_columns(df, text_cols)
+
+        # Date column parsed once per mapping (day-first aware); None marks it unparseable
+        date_cols = {col_map["date_col"]} if col_map["date_col"] else set()
+        if st.session_state.get("parsed_dates", {}).keys() != date_cols:
+            parsed_dates = {}
+            for col in date_cols:
+                try:
+                    parsed_dates[col] = parse_dates(df[col])
+                except ValueError:
+                    parsed_dates[col] = None
+            st.session_state["parsed_dates"] = parsed_dates
 
     # Quick dataset overview
     with st.expander("Dataset overview", expanded=False):
@@ -137,6 +227,8 @@ if "df" in st.session_state:
 
 if "messages" not in st.session_state:
     st.session_state["messages"] = []
+if "history_window" not in st.session_state:
+    st.session_state["history_window"] = deque(maxlen=HISTORY_WINDOW)
 
 # Render chat history
 for msg in st.session_state["messages"]:
@@ -164,8 +256,20 @@ else:
                 col_map = st.session_state["col_map"]
                 summary = st.session_state["summary"]
 
+                index = None
+                if use_semantic and col_map["finding_col"]:
+                    index = cached_semantic_index(
+                        st.session_state["file_key"], col_map["finding_col"], df
+                    )
+
                 # Step 1: Retrieve relevant rows
-                subset, retrieval_info = retrieve(df, query, col_map, llm_config)
+                subset, retrieval_info = retrieve(
+                    df, query, col_map, llm_config,
+                    semantic_index=index,
+                    prompt_context=st.session_state["prompt_context"],
+                    text_lower=st.session_state.get("text_cols_lower"),
+                    parsed_dates=st.session_state.get("parsed_dates"),
+                )
                 context_text = dataframe_to_text(subset)
 
                 # Step 2: Build analysis prompt
@@ -186,21 +290,19 @@ Relevant findings (filtered subset of {len(df):,} total rows):
 
                 messages = [
                     {"role": "system", "content": system_prompt},
-                    # Include recent conversation history for context
-                    *[
-                        {"role": m["role"], "content": m["content"]}
-                        for m in st.session_state["messages"][:-1]  # Exclude current query (already added)
-                        if m["role"] in ("user", "assistant")
-                    ][-6:],  # Last 3 exchanges
+                    # Recent conversation history for context (bounded, excludes current query)
+                    *st.session_state["history_window"],
                     {"role": "user", "content": user_prompt},
                 ]
 
-                try:
-                    response = chat(messages, llm_config, temperature=0.3, max_tokens=2048)
-                except Exception as e:
-                    response = f"❌ Error calling LLM: {e}\n\nCheck your configuration in the sidebar."
+            try:
+                response = st.write_stream(
+                    chat(messages, llm_config, temperature=0.3, max_tokens=2048, stream=True)
+                )
+            except Exception as e:
+                response = f"❌ Error calling LLM: {e}\n\nCheck your configuration in the sidebar."
+                st.markdown(response)
 
-            st.markdown(response)
             st.caption(f"🔍 Retrieval: {retrieval_info}")
 
         st.session_state["messages"].append({
@@ -208,9 +310,12 @@ Relevant findings (filtered subset of {len(df):,} total rows):
             "content": response,
             "retrieval_info": retrieval_info,
         })
+        st.session_state["history_window"].append({"role": "user", "content": query})
+        st.session_state["history_window"].append({"role": "assistant", "content": response})
 
 # Clear chat button
 if st.session_state.get("messages"):
     if st.button("🗑️ Clear chat", key="clear_chat"):
         st.session_state["messages"] = []
+        st.session_state["history_window"].clear()
         st.rerun()
@@ -2,29 +2,148 @@
 CSV loading, validation, and column detection.
 """
 
-import pandas as pd
-from typing import Optional
+import hashlib
 import io
+import os
+import re
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+from pandas.errors import ParserError
+
+# Tried in order. latin-1 is common in European corporate systems.
+CSV_ENCODINGS = ("utf-8", "latin-1")
+
+# String columns with fewer unique values than this fraction of rows become Categorical
+CATEGORY_MAX_RATIO = 0.05
+
+
+def _is_binary_column(series: pd.Series) -> bool:
+    return isinstance(series.dtype, pd.ArrowDtype) and (
+        pa.types.is_binary(series.dtype.pyarrow_dtype)
+        or pa.types.is_large_binary(series.dtype.pyarrow_dtype)
+    )
+
+
+def _read_csv_bytes(content: bytes) -> pd.DataFrame:
+    """
+    Parse CSV bytes with the multithreaded PyArrow reader, trying each encoding in turn.
+    Falls back to the pandas C engine for files Arrow can't parse
+    (e.g. quoted values spanning multiple lines).
+    """
+    for encoding in CSV_ENCODINGS:
+        try:
+            df = pd.read_csv(
+                io.BytesIO(content),
+                engine="pyarrow",
+                dtype_backend="pyarrow",
+                encoding=encoding,
+            )
+        except (UnicodeDecodeError, ParserError, pa.ArrowInvalid):
+            continue
+        # Arrow doesn't raise on undecodable text — it infers those columns as binary
+        if not any(_is_binary_column(df[col]) for col in df.columns):
+            return df
+
+    try:
+        return pd.read_csv(io.BytesIO(content), encoding="utf-8", dtype_backend="pyarrow")
+    except UnicodeDecodeError:
+        return pd.read_csv(io.BytesIO(content), encoding="latin-1", dtype_backend="pyarrow")
+
+
+def _parquet_cache_path(content: bytes) -> Optional[Path]:
+    """
+    Sidecar Parquet path for this file's content, or None if caching is disabled.
+    Enabled by setting PE_FINDINGS_CACHE_DIR (e.g. ~/.cache/pe-findings).
+    """
+    cache_dir = os.getenv("PE_FINDINGS_CACHE_DIR")
+    if not cache_dir:
+        return None
+    digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+    return Path(cache_dir).expanduser() / f"{digest}.parquet"
+
+
+def _write_parquet_cache(df: pd.DataFrame, path: Path) -> None:
+    """Best-effort write; a failed cache write must never fail the upload."""
+    tmp_path = path.with_suffix(".parquet.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(tmp_path, engine="pyarrow", compression="zstd", index=False)
+        os.replace(tmp_path, path)  # Atomic, so readers never see a partial file
+    except (OSError, ValueError, pa.ArrowException):
+        tmp_path.unlink(missing_ok=True)
+
+
+def _categorize_low_cardinality(df: pd.DataFrame, max_ratio: float = CATEGORY_MAX_RATIO) -> pd.DataFrame:
+    """
+    Convert repetitive string columns (asset tags, status, location) to Categorical.
+    Cuts memory and makes value_counts / == / groupby work on codes instead of strings.
+    """
+    if len(df) == 0:
+        return df
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_string_dtype(series) and series.nunique() / len(df) < max_ratio:
+            df[col] = series.astype("category")
+    return df
 
 
 def load_csv(file) -> pd.DataFrame:
-    """Load a CSV from a Streamlit UploadedFile or file path."""
+    """Load a CSV from a Streamlit UploadedFile, file-like object or file path."""
     if hasattr(file, "read"):
         content = file.read()
-        # Try UTF-8 first, fall back to latin-1 (common in European corporate systems)
-        try:
-            df = pd.read_csv(io.BytesIO(content), encoding="utf-8")
-        except UnicodeDecodeError:
-            df = pd.read_csv(io.BytesIO(content), encoding="latin-1")
     else:
+        with open(file, "rb") as f:
+            content = f.read()
+
+    df = None
+    # Same bytes seen before: skip CSV parsing entirely
+    cache_path = _parquet_cache_path(content)
+    if cache_path is not None and cache_path.exists():
         try:
-            df = pd.read_csv(file, encoding="utf-8")
-        except UnicodeDecodeError:
-            df = pd.read_csv(file, encoding="latin-1")
+            df = pd.read_parquet(cache_path, engine="pyarrow", dtype_backend="pyarrow")
+        except (OSError, pa.ArrowException):
+            pass  # Unreadable sidecar — reparse and overwrite it
 
-    # Clean column names: strip whitespace
-    df.columns = df.columns.str.strip()
-    return df
+    if df is None:
+        df = _read_csv_bytes(content)
+
+        # Clean column names: strip whitespace
+        df.columns = df.columns.str.strip()
+
+        # Cached before categorising: Arrow dictionary columns don't round-trip back to Categorical
+        if cache_path is not None:
+            _write_parquet_cache(df, cache_path)
+
+    return _categorize_low_cardinality(df)
+
+
+# Column-name candidates per role, in priority order
+COLUMN_ROLE_CANDIDATES = {
+    "finding_col": [
+        "finding", "annotation", "observation", "comment", "description",
+        "text", "note", "remarks", "detail"
+    ],
+    "asset_col": [
+        "asset", "tag", "equipment", "unit", "machine", "device"
+    ],
+    "location_col": [
+        "functional location", "floc", "functional_location", "location", "area", "plant"
+    ],
+    "date_col": [
+        "date", "timestamp", "created", "recorded", "reported", "raised"
+    ],
+    "status_col": [
+        "status", "state", "resolution", "resolved", "open", "closed"
+    ],
+}
+# One alternation per role for the partial-match fallback
+_ROLE_PATTERNS = {
+    role: re.compile("|".join(map(re.escape, candidates)))
+    for role, candidates in COLUMN_ROLE_CANDIDATES.items()
+}
 
 
 def detect_columns(df: pd.DataFrame) -> dict:
@@ -39,43 +158,44 @@ def detect_columns(df: pd.DataFrame) -> dict:
     """
     cols_lower = {c.lower(): c for c in df.columns}
 
-    def find(candidates):
+    def find(candidates, pattern):
         for c in candidates:
             if c in cols_lower:
                 return cols_lower[c]
-        # Partial match fallback
-        for c in candidates:
-            for col_l, col in cols_lower.items():
-                if c in col_l:
-                    return col
-        return None
-
-    finding_col = find([
-        "finding", "annotation", "observation", "comment", "description",
-        "text", "note", "remarks", "detail"
-    ])
-    asset_col = find([
-        "asset", "tag", "equipment", "unit", "machine", "device"
-    ])
-    location_col = find([
-        "functional location", "floc", "functional_location", "location", "area", "plant"
-    ])
-    date_col = find([
-        "date", "timestamp", "created", "recorded", "reported", "raised"
-    ])
-    status_col = find([
-        "status", "state", "resolution", "resolved", "open", "closed"
-    ])
+        # Partial match fallback: the column containing the highest-priority candidate
+        rank = {c: i for i, c in enumerate(candidates)}
+        best_col, best_rank = None, len(candidates)
+        for col_l, col in cols_lower.items():
+            for match in pattern.findall(col_l):
+                if rank[match] < best_rank:
+                    best_col, best_rank = col, rank[match]
+        return best_col
 
     return {
-        "finding_col": finding_col,
-        "asset_col": asset_col,
-        "location_col": location_col,
-        "date_col": date_col,
-        "status_col": status_col,
+        role: find(candidates, _ROLE_PATTERNS[role])
+        for role, candidates in COLUMN_ROLE_CANDIDATES.items()
     }
 
 
+def parse_dates(series: pd.Series) -> pd.Series:
+    """
+    Parse a date column strictly. Text dates are tried month-first, then day-first
+    (common in European exports), and the first reading that parses every non-null
+    value wins.
+    Raises ValueError if neither does, rather than silently turning rows into NaT.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return pd.to_datetime(series)
+
+    text = series.astype("string")
+    present = text.notna().to_numpy()
+    for dayfirst in (False, True):
+        parsed = pd.to_datetime(text, errors="coerce", dayfirst=dayfirst)
+        if not parsed.isna().to_numpy()[present].any():
+            return parsed
+    raise ValueError(f"Column {series.name!r} has values that don't parse as dates")
+
+
 def get_dataset_summary(df: pd.DataFrame, col_map: dict) -> str:
     """Generate a plain-text summary of the dataset for use in LLM prompts."""
     lines = [
@@ -91,7 +211,7 @@ def get_dataset_summary(df: pd.DataFrame, col_map: dict) -> str:
 
     if col_map.get("date_col") and col_map["date_col"] in df.columns:
         try:
-            dates = pd.to_datetime(df[col_map["date_col"]], errors="coerce").dropna()
+            dates = parse_dates(df[col_map["date_col"]]).dropna()
             if len(dates):
                 lines.append(f"Date range: {dates.min().date()} to {dates.max().date()}")
         except Exception:
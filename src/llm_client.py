@@ -3,19 +3,31 @@ Model-agnostic LLM client using LiteLLM.
 Supports OpenAI, Anthropic, Azure, Ollama, and any OpenAI-compatible endpoint.
 """
 
+from typing import Iterator
+
+import httpx
 import litellm
 from src.config import LLMConfig
 
 # Suppress LiteLLM verbose logging
 litellm.suppress_debug_info = True
 
+# One keep-alive connection pool for all sync calls, so multi-turn chat reuses
+# TLS connections instead of handshaking per request. Used by LiteLLM's
+# OpenAI-compatible providers (openai, azure, custom api_base endpoints).
+litellm.client_session = httpx.Client(
+    timeout=httpx.Timeout(600.0, connect=10.0),
+    limits=httpx.Limits(max_keepalive_connections=10),
+)
+
 
 def chat(
     messages: list[dict],
     config: LLMConfig,
     temperature: float = 0.2,
     max_tokens: int = 2048,
-) -> str:
+    stream: bool = False,
+) -> str | Iterator[str]:
     """
     Send a chat completion request.
 
@@ -24,10 +36,40 @@ def chat(
         config: LLMConfig with model, api_key, api_base
         temperature: Lower = more deterministic (good for analysis)
         max_tokens: Max response length
+        stream: Yield response text incrementally instead of waiting for the full completion
 
     Returns:
-        Response string
+        Response string, or an iterator of text chunks if stream=True
     """
+    kwargs = _completion_kwargs(messages, config, temperature, max_tokens)
+
+    if stream:
+        # Request is sent here so connection/auth errors raise before iteration starts
+        return _iter_chunks(litellm.completion(**kwargs, stream=True))
+
+    response = litellm.completion(**kwargs)
+    return response.choices[0].message.content
+
+
+async def achat(
+    messages: list[dict],
+    config: LLMConfig,
+    temperature: float = 0.2,
+    max_tokens: int = 2048,
+) -> str:
+    """Async variant of chat() for running LLM calls concurrently with other work."""
+    response = await litellm.acompletion(
+        **_completion_kwargs(messages, config, temperature, max_tokens)
+    )
+    return response.choices[0].message.content
+
+
+def _completion_kwargs(
+    messages: list[dict],
+    config: LLMConfig,
+    temperature: float,
+    max_tokens: int,
+) -> dict:
     kwargs = {
         "model": config.model_string,
         "messages": messages,
@@ -41,8 +83,12 @@ def chat(
     if config.api_base:
         kwargs["api_base"] = config.api_base
 
-    response = litellm.completion(**kwargs)
-    return response.choices[0].message.content
+    return kwargs
+
+
+def _iter_chunks(response) -> Iterator[str]:
+    for chunk in response:
+        yield chunk.choices[0].delta.content or ""
 
 
 def check_connection(config: LLMConfig) -> tuple[bool, str]:
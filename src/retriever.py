@@ -2,20 +2,31 @@
 Smart retrieval: given a user query and a dataframe, return a relevant subset.
 
 Strategy:
-1. Ask the LLM to generate a pandas filter expression based on the query + column info
-2. Apply the filter
-3. If the filter returns too many rows, apply keyword search on top
+1. Ask the LLM for a JSON filter spec based on the query + column info
+   (skipped for obviously broad questions like "summarise all findings").
+   With a semantic index, semantic search runs concurrently with this call.
+2. Validate the spec against the columns and apply it as vectorised masks
+3. If the filter returns too many rows, keep the ones semantic search ranks highest
 4. If filter fails or returns nothing, fall back to keyword search
+   (fused with semantic search via reciprocal rank fusion when an index is available)
 5. If all else fails, return a representative sample
 """
 
+import asyncio
+import json
 import re
+import numpy as np
 import pandas as pd
+from src.data_loader import parse_dates
+from src.semantic_index import search as semantic_search
 from src.config import LLMConfig
-from src.llm_client import chat
+from src.llm_client import achat, chat
 
 MAX_ROWS_FOR_CONTEXT = 150  # Rows to pass to the analysis LLM
-FILTER_PROMPT_TEMPLATE = """You are a data analyst assistant. Given a pandas DataFrame with the following columns and sample data, generate a Python pandas filter expression to retrieve rows relevant to the user's question.
+MAX_EXTRA_PROMPT_COLUMNS = 10  # Unmapped text columns described in the filter prompt
+MAX_PROMPT_VALUE_CHARS = 40  # Truncate example values in the filter prompt
+KEYWORD_SCAN_CHUNK_ROWS = 50_000  # Keyword search stops after the chunk that fills the context
+FILTER_PROMPT_TEMPLATE = """You are a data analyst assistant. Given a table with the following columns and sample data, write a JSON filter that selects the rows relevant to the user's question.
 
 COLUMNS AND TYPES:
 {column_info}
@@ -26,59 +37,311 @@ SAMPLE VALUES (first 3 rows):
 USER QUESTION:
 {question}
 
-Respond with ONLY a valid pandas filter expression (the part that goes inside df[...]).
+Respond with ONLY a JSON object. Each key is a column name, optionally with an operator suffix; all conditions must hold.
+  "<column>": value or [values]      equals (case-insensitive for text), or any of a list
+  "<column>_ne": value               not equal
+  "<column>_contains": "text" or [texts]    case-insensitive substring match (any of a list)
+  "<column>_gte" / "_lte" / "_gt" / "_lt": value    numeric or date comparison
 Examples:
-  df['asset'] == 'P-101'
-  df['status'].str.lower().str.contains('open', na=False)
-  (df['asset'] == 'K-201') & (df['status'].str.lower() == 'open')
-  df['date'] >= '2024-01-01'
+  {{"asset": "P-101"}}
+  {{"status_contains": "open"}}
+  {{"asset": ["K-201", "P-101"], "status": "Open"}}
+  {{"date_gte": "2024-01-01"}}
 
-If the question is broad (e.g. "summarise all findings") or cannot be filtered, respond with: ALL
-Do not include any explanation. Only the expression or ALL."""
+If the question is broad (e.g. "summarise all findings") or cannot be filtered, respond with: {{}}
+Do not include any explanation. Only the JSON object."""
 
+# Key suffix → operator in the JSON filter spec. Longest first, so "_gte" wins over "_gt".
+_FILTER_OPS = ("_contains", "_gte", "_lte", "_ne", "_gt", "_lt")
+# Questions that ask about the dataset as a whole — the filter LLM would answer ALL anyway.
+# Only whole-dataset phrasings count: every other word must be filler, so any qualifier
+# (status, date, engineer, asset tag...) still goes to the filter LLM.
+_BROAD_TRIGGER = re.compile(r"^(summar\w*|overview|overall)$")
+_BROAD_FILLER = {
+    "a", "all", "an", "can", "data", "database", "dataset", "entire", "every", "finding",
+    "findings", "full", "give", "i", "is", "me", "of", "please", "provide", "the", "this",
+    "what", "whole", "you",
+}
+_QUERY_TOKEN = re.compile(r"[a-z0-9][\w\-./]*")
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
 
-def _build_column_info(df: pd.DataFrame) -> str:
+
+def _prompt_columns(df: pd.DataFrame, col_map: dict) -> list[str]:
+    # Mapped columns first, then up to 10 other text columns — numeric/date
+    # columns and long tails of extra fields mostly just bloat the prompt
+    mapped = [c for c in col_map.values() if c and c in df.columns]
+    other_text_cols = [
+        c for c in df.columns
+        if c not in mapped
+        and (pd.api.types.is_string_dtype(df[c]) or isinstance(df[c].dtype, pd.CategoricalDtype))
+    ]
+    return list(dict.fromkeys(mapped)) + other_text_cols[:MAX_EXTRA_PROMPT_COLUMNS]
+
+
+def _build_column_info(df: pd.DataFrame, priority_cols: list[str]) -> str:
     lines = []
-    for col in df.columns:
+    for col in priority_cols:
         dtype = str(df[col].dtype)
-        sample = df[col].dropna().unique()[:5].tolist()
+        # The first 5 unique values are almost always within the first 1000 rows
+        sample = [
+            str(v)[:MAX_PROMPT_VALUE_CHARS]
+            for v in df[col].head(1000).dropna().unique()[:5].tolist()
+        ]
         lines.append(f"  {col!r} ({dtype}): e.g. {sample}")
     return "\n".join(lines)
 
 
-def _apply_filter_expression(df: pd.DataFrame, expr: str) -> pd.DataFrame | None:
-    """Safely evaluate a filter expression. Returns None if it fails."""
+def build_prompt_context(df: pd.DataFrame, col_map: dict) -> tuple[str, str]:
+    """
+    Column info and sample rows for the filter prompt.
+    Depends only on the dataframe and column mapping, so callers can compute it once per dataset.
+    """
+    priority_cols = _prompt_columns(df, col_map)
+    # Same columns and truncation as the column info: full-width rows of long finding
+    # text would otherwise dominate the prompt
+    sample_rows = (
+        df[priority_cols].head(3).astype("string")
+        .apply(lambda col: col.str.slice(0, MAX_PROMPT_VALUE_CHARS))
+        .to_csv(index=False)
+    )
+    return _build_column_info(df, priority_cols), sample_rows
+
+
+def _is_broad_query(query: str) -> bool:
+    """Cheap client-side check that saves a filter-generation LLM round-trip."""
+    tokens = [t.rstrip(".-/") for t in _QUERY_TOKEN.findall(query.lower())]
+    return any(_BROAD_TRIGGER.match(t) for t in tokens) and all(
+        _BROAD_TRIGGER.match(t) or t in _BROAD_FILLER for t in tokens
+    )
+
+
+def _parse_filter_spec(text: str) -> dict | None:
+    """Parse the LLM's JSON filter. Returns {} for ALL, None if it isn't a valid spec."""
+    text = _CODE_FENCE.sub("", text.strip())
+    if not text or text.upper() == "ALL":
+        return {}
     try:
-        # Sanitise: only allow eval in restricted context
-        result = df[eval(expr, {"df": df, "pd": pd, "__builtins__": {}})]
-        if isinstance(result, pd.DataFrame):
-            return result
-    except Exception:
-        pass
+        spec = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(spec, dict):
+        return None
+    for value in spec.values():
+        values = value if isinstance(value, list) else [value]
+        if not all(isinstance(v, (str, int, float, bool)) for v in values):
+            return None
+    return spec
+
+
+def _split_filter_key(key: str, columns) -> tuple[str, str] | None:
+    """Resolve a spec key to (column, op). Exact column names take precedence over suffixes."""
+    if key in columns:
+        return key, "eq"
+    for suffix in _FILTER_OPS:
+        if key.endswith(suffix) and key[: -len(suffix)] in columns:
+            return key[: -len(suffix)], suffix[1:]
     return None
 
 
-def _keyword_search(df: pd.DataFrame, query: str, text_cols: list[str]) -> pd.DataFrame:
-    """Simple keyword search across text columns."""
-    if not text_cols:
-        return df.sample(min(MAX_ROWS_FOR_CONTEXT, len(df)))
+def _condition_mask(series: pd.Series, op: str, value, dates: pd.Series | None = None) -> np.ndarray:
+    """
+    Vectorised boolean mask for one spec condition. Raises ValueError/TypeError on bad values.
+    `dates` is the column already run through parse_dates(), if the caller has it.
+    """
+    if op in ("eq", "ne"):
+        values = value if isinstance(value, list) else [value]
+        if pd.api.types.is_numeric_dtype(series):
+            matches = series.isin(values)
+        else:
+            text = series.astype("string[pyarrow]").str.lower()
+            matches = text.isin([str(v).lower() for v in values])
+        mask = matches.to_numpy(dtype=bool, na_value=False)
+        return ~mask if op == "ne" else mask
+
+    if op == "contains":
+        text = series.astype("string[pyarrow]")
+        mask = np.zeros(len(series), dtype=bool)
+        for v in value if isinstance(value, list) else [value]:
+            matches = text.str.contains(str(v), case=False, regex=False, na=False)
+            mask |= matches.to_numpy(dtype=bool, na_value=False)
+        return mask
+
+    # Range comparisons: numeric columns compare as numbers, everything else as dates
+    if pd.api.types.is_numeric_dtype(series):
+        left, right = series, float(value)
+    else:
+        left = dates if dates is not None else parse_dates(series)
+        right = pd.Timestamp(value)
+    compare = {"gte": left.ge, "lte": left.le, "gt": left.gt, "lt": left.lt}[op]
+    return compare(right).to_numpy(dtype=bool, na_value=False)
+
+
+def _apply_filter_spec(
+    df: pd.DataFrame, spec: dict, parsed_dates: dict[str, pd.Series] | None = None
+) -> pd.DataFrame | None:
+    """
+    Apply a parsed JSON filter spec. Returns None if it references unknown columns or bad values,
+    including range filters on a column that doesn't parse as dates.
+    `parsed_dates` maps column name -> parse_dates() output (None if it didn't parse),
+    to skip re-parsing per query.
+    """
+    parsed_dates = parsed_dates or {}
+    mask = np.ones(len(df), dtype=bool)
+    for key, value in spec.items():
+        resolved = _split_filter_key(key, df.columns)
+        if resolved is None:
+            return None
+        col, op = resolved
+        if isinstance(value, list) and op not in ("eq", "ne", "contains"):
+            return None  # A range bound must be a single value
+        if op not in ("eq", "ne", "contains") and col in parsed_dates and parsed_dates[col] is None:
+            return None  # Already known not to parse as dates
+        try:
+            mask &= _condition_mask(df[col], op, value, parsed_dates.get(col))
+        except (ValueError, TypeError):
+            return None
+    return df[mask]
+
+
+def lowercase_text_columns(df: pd.DataFrame, text_cols: list[str]) -> dict[str, pd.Series]:
+    """
+    Lowercased, Arrow-backed copies of the keyword-search columns.
+    Findings text doesn't change during a session, so callers can compute this once
+    and pass it to retrieve() instead of paying an O(N) conversion per query.
+    """
+    return {
+        col: df[col].astype("string[pyarrow]").str.lower()
+        for col in text_cols
+        if col in df.columns
+    }
+
 
+def _keyword_positions(
+    query: str,
+    text_lower: dict[str, pd.Series],
+    limit: int | None = None,
+) -> np.ndarray:
+    """
+    Row positions (in file order) where any query keyword appears in a text column.
+    Scans in chunks, stops once `limit` matches are found and returns at most `limit`.
+    """
     keywords = [w.lower() for w in query.split() if len(w) > 3]
-    if not keywords:
-        return df.sample(min(MAX_ROWS_FOR_CONTEXT, len(df)))
-
-    mask = pd.Series([False] * len(df), index=df.index)
-    for col in text_cols:
-        if col in df.columns:
-            col_lower = df[col].astype(str).str.lower()
-            for kw in keywords:
-                mask = mask | col_lower.str.contains(kw, na=False)
-
-    results = df[mask]
-    if len(results) == 0:
+    if not keywords or not text_lower:
+        return np.array([], dtype=np.intp)
+
+    # One pass per column: a single keyword is a plain substring match, several are
+    # folded into one alternation. Arrow-backed strings run both in Arrow's kernels.
+    if len(set(keywords)) == 1:
+        pattern, regex = keywords[0], False
+    else:
+        pattern, regex = "|".join(map(re.escape, keywords)), True
+
+    n_rows = len(next(iter(text_lower.values())))
+    hits, n_found = [], 0
+    for start in range(0, n_rows, KEYWORD_SCAN_CHUNK_ROWS):
+        stop = min(start + KEYWORD_SCAN_CHUNK_ROWS, n_rows)
+        mask = np.zeros(stop - start, dtype=bool)
+        for col_lower in text_lower.values():
+            matches = col_lower.iloc[start:stop].str.contains(pattern, regex=regex, na=False)
+            mask |= matches.to_numpy(dtype=bool, na_value=False)
+
+        chunk_hits = np.flatnonzero(mask) + start
+        hits.append(chunk_hits)
+        n_found += len(chunk_hits)
+        if limit is not None and n_found >= limit:
+            break
+
+    positions = np.concatenate(hits) if hits else np.array([], dtype=np.intp)
+    # The last chunk can overshoot by up to a chunk's worth; callers only keep `limit`
+    return positions if limit is None else positions[:limit]
+
+
+def _representative_sample(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Deterministic sample for when nothing matches: evenly strided rows on large frames
+    (a uniform spread over time if the export is date-sorted), the head otherwise.
+    O(k) unlike df.sample, and stable across Streamlit reruns.
+    """
+    if len(df) <= 10 * MAX_ROWS_FOR_CONTEXT:
+        return df.head(MAX_ROWS_FOR_CONTEXT)
+    step = len(df) // MAX_ROWS_FOR_CONTEXT
+    return df.iloc[::step][:MAX_ROWS_FOR_CONTEXT]
+
+
+def _keyword_search(df: pd.DataFrame, query: str, text_lower: dict[str, pd.Series]) -> pd.DataFrame:
+    """Simple keyword search across text columns."""
+    positions = _keyword_positions(query, text_lower, limit=MAX_ROWS_FOR_CONTEXT)
+    if len(positions) == 0:
         # Nothing matched — return sample
-        return df.sample(min(MAX_ROWS_FOR_CONTEXT, len(df)))
-    return results
+        return _representative_sample(df)
+    return df.iloc[positions]
+
+
+def _reciprocal_rank_fusion(rankings: list[list[int]], k: int = 60) -> list[int]:
+    """Merge ranked lists of row positions: score = sum of 1 / (k + rank)."""
+    scores: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, pos in enumerate(ranking):
+            scores[pos] = scores.get(pos, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def _search(
+    df: pd.DataFrame,
+    query: str,
+    text_lower: dict[str, pd.Series],
+    semantic_hits: list[int] | None = None,
+) -> tuple[pd.DataFrame, str]:
+    """
+    Fallback search used when no filter applies.
+    Keyword search alone, or fused with semantic search hits (row positions) if given.
+    Returns (subset, method_name).
+    """
+    if semantic_hits is None:
+        return _keyword_search(df, query, text_lower), "keyword search"
+
+    lexical = _keyword_positions(query, text_lower, limit=MAX_ROWS_FOR_CONTEXT).tolist()
+    fused = _reciprocal_rank_fusion([semantic_hits, lexical])[:MAX_ROWS_FOR_CONTEXT]
+    return df.iloc[fused], "hybrid search (semantic + keyword)"
+
+
+def _rank_by_semantic(df: pd.DataFrame, filtered: pd.DataFrame, semantic_hits: list[int]) -> pd.DataFrame:
+    """Reorder a filter result so rows that are also semantic hits come first."""
+    positions = df.index.get_indexer(filtered.index)
+    in_filter = np.zeros(len(df), dtype=bool)
+    in_filter[positions] = True
+    top = [p for p in semantic_hits if in_filter[p]]
+    in_filter[top] = False
+    rest = positions[in_filter[positions]]
+    return df.iloc[top + rest[: MAX_ROWS_FOR_CONTEXT - len(top)].tolist()]
+
+
+def _semantic_hits(index, query: str) -> list[int] | None:
+    if index is None:
+        return None
+    try:
+        return semantic_search(index, query, MAX_ROWS_FOR_CONTEXT)
+    except Exception:
+        return None  # Semantic search is an enhancement — keyword search still works
+
+
+async def _generate_filter_with_semantic(filter_prompt: str, config: LLMConfig, index, query: str):
+    """
+    Run filter generation and semantic search concurrently.
+    The ~50ms local search hides entirely behind the ~1-5s LLM round-trip.
+    Returns (filter_response or the LLM exception, semantic_hits or None).
+    """
+    filter_result, hits = await asyncio.gather(
+        achat(
+            messages=[{"role": "user", "content": filter_prompt}],
+            config=config,
+            temperature=0.0,
+            max_tokens=200,
+        ),
+        asyncio.to_thread(_semantic_hits, index, query),
+        return_exceptions=True,
+    )
+    return filter_result, hits
 
 
 def retrieve(
@@ -86,49 +349,81 @@ def retrieve(
     query: str,
     col_map: dict,
     config: LLMConfig,
+    semantic_index=None,
+    prompt_context: tuple[str, str] | None = None,
+    text_lower: dict[str, pd.Series] | None = None,
+    parsed_dates: dict[str, pd.Series] | None = None,
 ) -> tuple[pd.DataFrame, str]:
     """
     Returns (relevant_subset_df, retrieval_method_description)
+
+    `semantic_index` is an optional FAISS index over the finding column
+    (see src.semantic_index.build_index). When given, semantic search runs alongside
+    filter generation and fallback searches are hybrid.
+    `prompt_context` is the precomputed output of build_prompt_context(df, col_map).
+    `text_lower` is the precomputed output of lowercase_text_columns(df, text_cols).
+    `parsed_dates` maps the date column to its parse_dates() output.
     """
     # Identify text columns for keyword fallback
     text_cols = [v for v in [col_map.get("finding_col"), col_map.get("asset_col")] if v]
+    if text_lower is None or set(text_lower) != set(text_cols):
+        text_lower = lowercase_text_columns(df, text_cols)
 
-    # Step 1: Ask LLM for a filter expression
-    column_info = _build_column_info(df)
-    sample_rows = df.head(3).to_csv(index=False)
+    # Step 1: Ask LLM for a filter spec (skipped for obviously broad questions)
+    semantic_hits = None
+    if _is_broad_query(query):
+        filter_response = "ALL"
+        semantic_hits = _semantic_hits(semantic_index, query)
+    else:
+        column_info, sample_rows = prompt_context or build_prompt_context(df, col_map)
 
-    filter_prompt = FILTER_PROMPT_TEMPLATE.format(
-        column_info=column_info,
-        sample_rows=sample_rows,
-        question=query,
-    )
+        filter_prompt = FILTER_PROMPT_TEMPLATE.format(
+            column_info=column_info,
+            sample_rows=sample_rows,
+            question=query,
+        )
 
-    try:
-        filter_expr = chat(
-            messages=[{"role": "user", "content": filter_prompt}],
-            config=config,
-            temperature=0.0,
-            max_tokens=200,
-        ).strip()
-    except Exception as e:
-        # LLM call failed — fall back to keyword search
-        subset = _keyword_search(df, query, text_cols)
-        return subset.head(MAX_ROWS_FOR_CONTEXT), f"keyword search (LLM unavailable: {e})"
+        if semantic_index is None:
+            try:
+                filter_response = chat(
+                    messages=[{"role": "user", "content": filter_prompt}],
+                    config=config,
+                    temperature=0.0,
+                    max_tokens=200,
+                )
+            except Exception as e:
+                filter_response = e
+        else:
+            filter_response, semantic_hits = asyncio.run(
+                _generate_filter_with_semantic(filter_prompt, config, semantic_index, query)
+            )
+
+        if isinstance(filter_response, Exception):
+            # LLM call failed — fall back to keyword search
+            subset, method = _search(df, query, text_lower, semantic_hits)
+            return subset.head(MAX_ROWS_FOR_CONTEXT), f"{method} (LLM unavailable: {filter_response})"
+        filter_response = filter_response.strip()
 
     # Step 2: Apply filter
-    if filter_expr.upper() == "ALL" or not filter_expr:
+    spec = _parse_filter_spec(filter_response)
+    if spec == {}:
         # Broad query — use keyword search or sample
-        subset = _keyword_search(df, query, text_cols)
-        method = "keyword search (broad query)"
+        subset, method = _search(df, query, text_lower, semantic_hits)
+        method += " (broad query)"
     else:
-        filtered = _apply_filter_expression(df, filter_expr)
+        filtered = _apply_filter_spec(df, spec, parsed_dates) if spec is not None else None
         if filtered is not None and len(filtered) > 0:
+            # The filter is more precise than semantic search, so it wins when it matches.
+            # If it matched more rows than fit in context, keep the semantically closest.
             subset = filtered
-            method = f"pandas filter: `{filter_expr}` → {len(filtered)} rows"
+            method = f"filter: `{json.dumps(spec)}` → {len(filtered)} rows"
+            if semantic_hits and len(filtered) > MAX_ROWS_FOR_CONTEXT:
+                subset = _rank_by_semantic(df, filtered, semantic_hits)
+                method += f", ranked by semantic similarity [trimmed to {MAX_ROWS_FOR_CONTEXT}]"
         else:
             # Filter returned nothing or failed — fall back to keyword
-            subset = _keyword_search(df, query, text_cols)
-            method = f"keyword search (filter failed or empty: `{filter_expr}`)"
+            subset, method = _search(df, query, text_lower, semantic_hits)
+            method += f" (filter failed or empty: `{filter_response}`)"
 
     # Step 3: Trim to context limit
     if len(subset) > MAX_ROWS_FOR_CONTEXT:
@@ -0,0 +1,98 @@
+"""
+Optional semantic retrieval over the finding text column.
+
+Embeds each finding with a small local sentence-transformers model and indexes the
+vectors with FAISS HNSW for approximate nearest-neighbour search. Catches matches
+that keyword search misses ("leak" vs "seepage").
+
+Requires the optional `sentence-transformers` and `faiss-cpu` packages. Embedding runs
+locally; the model weights are downloaded once from the Hugging Face hub if not cached.
+Encoding is the dominant ingest cost, so the model runs in FP16 on CUDA and with INT8
+dynamic quantization on CPU. Vectors are stored as FP16 in the index.
+"""
+
+import warnings
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+try:
+    import faiss
+    import torch
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # Optional dependencies — semantic retrieval is disabled without them
+    faiss = None
+    torch = None
+    SentenceTransformer = None
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+HNSW_M = 32  # Graph neighbours per node: higher = better recall, more memory
+ENCODE_BATCH_SIZE = 512
+
+
+def is_available() -> bool:
+    """True if the optional semantic retrieval dependencies are installed."""
+    return faiss is not None and SentenceTransformer is not None
+
+
+@lru_cache(maxsize=1)
+def _get_model():
+    if torch.cuda.is_available():
+        return SentenceTransformer(EMBEDDING_MODEL, device="cuda").half()
+
+    # CPU: INT8 dynamic quantization of the Linear layers (uses VNNI where available).
+    # torch.ao.quantization is deprecated upstream, so any failure falls back to FP32
+    # rather than taking semantic search down with a torch upgrade.
+    model = SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # Deprecation notice on every load
+            return torch.ao.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+    except Exception:
+        return model
+
+
+def _encode(texts: list[str]) -> np.ndarray:
+    with torch.inference_mode():
+        embeddings = _get_model().encode(
+            texts,
+            batch_size=ENCODE_BATCH_SIZE,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+        )
+    # FAISS takes float32 input regardless of model precision
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def build_index(df: pd.DataFrame, text_col: str):
+    """
+    Embed `text_col` and build an HNSW index over it.
+
+    Returns:
+        (faiss index, float16 embeddings array). Index ids are row positions in `df`.
+    """
+    texts = df[text_col].astype("string").fillna("").tolist()
+    embeddings = _encode(texts)
+
+    # Embeddings are L2-normalised, so inner product == cosine similarity.
+    # FP16 scalar quantization halves index memory with negligible recall loss.
+    index = faiss.IndexHNSWSQ(
+        EMBEDDING_DIM, faiss.ScalarQuantizer.QT_fp16, HNSW_M, faiss.METRIC_INNER_PRODUCT
+    )
+    index.train(embeddings)  # No-op for fp16, but required before add() for SQ indexes
+    index.add(embeddings)
+    return index, embeddings.astype(np.float16)
+
+
+def search(index, query: str, k: int) -> list[int]:
+    """Return row positions of the top-k most similar findings, best first."""
+    k = min(k, index.ntotal)
+    if k == 0:
+        return []
+    _, ids = index.search(_encode([query]), k)
+    return [int(i) for i in ids[0] if i >= 0]
@@ -0,0 +1,8 @@
+import os
+import sys
+from pathlib import Path
+
+# Use litellm's bundled model cost map instead of fetching it on import
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
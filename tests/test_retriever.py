@@ -0,0 +1,95 @@
+import io
+
+import pandas as pd
+import pytest
+
+from src.data_loader import parse_dates
+from src.retriever import _apply_filter_spec, _parse_filter_spec
+
+
+@pytest.fixture
+def findings() -> pd.DataFrame:
+    csv = (
+        "asset,status,finding,impact,date,reported\n"
+        "P-101,Open,Bearing vibration high,2.5,2024-01-08,08/01/2024\n"
+        "K-201,Closed,Suction pressure low,1.0,2024-02-15,15/02/2024\n"
+        "P-101,Resolved,Seal leak on pump,0.5,2024-03-20,20/03/2024\n"
+        "V-301,open,Valve passing,3.0,2024-04-02,02/04/2024\n"
+    )
+    return pd.read_csv(io.StringIO(csv), engine="pyarrow", dtype_backend="pyarrow")
+
+
+def _assets(df):
+    return df["asset"].tolist()
+
+
+def test_parse_filter_spec_all_and_json():
+    assert _parse_filter_spec("ALL") == {}
+    assert _parse_filter_spec('```json\n{"asset": "P-101"}\n```') == {"asset": "P-101"}
+    assert _parse_filter_spec('{"asset": ["P-101", "K-201"]}') == {"asset": ["P-101", "K-201"]}
+
+
+@pytest.mark.parametrize("text", ["not json", '["P-101"]', '{"asset": {"eq": "P-101"}}'])
+def test_parse_filter_spec_rejects_invalid(text):
+    assert _parse_filter_spec(text) is None
+
+
+def test_eq_is_case_insensitive_and_accepts_lists(findings):
+    assert _assets(_apply_filter_spec(findings, {"status": "open"})) == ["P-101", "V-301"]
+    assert _assets(_apply_filter_spec(findings, {"asset": ["p-101", "K-201"]})) == [
+        "P-101", "K-201", "P-101",
+    ]
+
+
+def test_ne_with_list(findings):
+    assert _assets(_apply_filter_spec(findings, {"status_ne": ["open", "closed"]})) == ["P-101"]
+
+
+def test_contains_with_list(findings):
+    result = _apply_filter_spec(findings, {"finding_contains": ["LEAK", "valve"]})
+    assert _assets(result) == ["P-101", "V-301"]
+
+
+def test_numeric_eq_and_range(findings):
+    assert _assets(_apply_filter_spec(findings, {"impact": [1.0, 3]})) == ["K-201", "V-301"]
+    assert _assets(_apply_filter_spec(findings, {"impact_gte": 1, "impact_lt": 3})) == [
+        "P-101", "K-201",
+    ]
+
+
+def test_range_on_date32_column(findings):
+    assert str(findings["date"].dtype) == "date32[day][pyarrow]"
+    result = _apply_filter_spec(findings, {"date_gte": "2024-02-15", "date_lt": "2024-04-01"})
+    assert _assets(result) == ["K-201", "P-101"]
+
+
+def test_range_on_day_first_string_dates(findings):
+    assert pd.api.types.is_string_dtype(findings["reported"])
+    result = _apply_filter_spec(findings, {"reported_gte": "2024-02-15"})
+    assert _assets(result) == ["K-201", "P-101", "V-301"]
+
+
+def test_range_uses_precomputed_dates(findings):
+    parsed = {"reported": parse_dates(findings["reported"])}
+    result = _apply_filter_spec(findings, {"reported_lt": "2024-02-01"}, parsed)
+    assert _assets(result) == ["P-101"]
+
+
+def test_range_on_unparseable_column_is_rejected(findings):
+    assert _apply_filter_spec(findings, {"finding_gte": "2024-01-01"}) is None
+    assert _apply_filter_spec(findings, {"reported_gte": "2024-01-01"}, {"reported": None}) is None
+
+
+def test_range_rejects_list_and_bad_bound(findings):
+    assert _apply_filter_spec(findings, {"impact_gte": [1, 2]}) is None
+    assert _apply_filter_spec(findings, {"impact_gte": "high"}) is None
+
+
+def test_unknown_keys_are_rejected(findings):
+    assert _apply_filter_spec(findings, {"priority": "High"}) is None
+    assert _apply_filter_spec(findings, {"asset_startswith": "P"}) is None
+
+
+def test_parse_dates_raises_on_partial_parse():
+    with pytest.raises(ValueError):
+        parse_dates(pd.Series(["2024-01-08", "soon", None], name="date"))